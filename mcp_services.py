@@ -5,7 +5,11 @@ Contains calling functions for MCP services such as Bing search, Amap, and aggre
 import os
 import json
 import time
+import sqlite3
+import threading
 import requests
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any
 from qwen_agent.tools.base import BaseTool, register_tool
 
@@ -22,16 +26,17 @@ os.makedirs(IMAGES_DIR, exist_ok=True)
 # Get API key from environment variables
 modelscope_token = os.getenv('MODELSCOPE_TOKEN', 'ms-90dcd170-3e12-4906-9a75-b9d05ef5be7f')
 
-# Track last call time for each API to manage QPS
-amap_api_last_call = {
-    'maps_text_search': 0,
-    'maps_search_detail': 0,
-    'maps_geo': 0,
-    'maps_around_search': 0
-}
+# Track recent call start times for each API to manage QPS
+amap_api_call_times = defaultdict(deque)
 
-# Minimum delay between API calls (in seconds) to avoid QPS limits
-AMAP_API_DELAY = 0.5  # 500ms delay to respect QPS limits
+# Per-API QPS quota: at most AMAP_API_QPS calls may start within any AMAP_API_WINDOW seconds,
+# so a burst of calls can be in flight together as long as it stays inside the quota
+AMAP_API_QPS = 3
+AMAP_API_WINDOW = 1.0
+amap_api_lock = threading.Lock()
+
+# Maximum number of concurrent Amap requests issued by MCPAmapMapsTool.batch_call
+AMAP_BATCH_MAX_WORKERS = 4
 
 def download_and_save_image(image_url: str, filename: str = None) -> str:
     """
@@ -231,13 +236,20 @@ def run_mcp(server_name: str, tool_name: str, args: dict) -> dict:
                 raise Exception("AMAP_API_KEY environment variable is not set")
             
             # Implement rate limiting to avoid QPS limits
-            current_time = time.time()
-            time_since_last_call = current_time - amap_api_last_call.get(tool_name, 0)
-            if time_since_last_call < AMAP_API_DELAY:
-                time.sleep(AMAP_API_DELAY - time_since_last_call)
-            
-            # Update last call time
-            amap_api_last_call[tool_name] = time.time()
+            # Reserve a start time under the lock: once AMAP_API_QPS calls have started within the
+            # window, the next one waits until the oldest of them leaves the window
+            with amap_api_lock:
+                current_time = time.time()
+                call_times = amap_api_call_times[tool_name]
+                while call_times and call_times[0] <= current_time - AMAP_API_WINDOW:
+                    call_times.popleft()
+                if len(call_times) < AMAP_API_QPS:
+                    scheduled_time = current_time
+                else:
+                    scheduled_time = call_times[-AMAP_API_QPS] + AMAP_API_WINDOW
+                call_times.append(scheduled_time)
+            if scheduled_time > current_time:
+                time.sleep(scheduled_time - current_time)
             
             if tool_name == "maps_text_search":
                 # Amap text search with retry mechanism
@@ -1173,6 +1185,86 @@ class MCPMapsTool(BaseTool):
         return str(result)
 
 
+# Amap action dispatch table: action -> (MCP tool name, ((call arg, source arg, default), ...), required source args)
+AMAP_ACTION_MAP = {
+    'geocode': ('maps_geo', (('address', 'address', ''), ('city', 'city', '')), ('address',)),
+    'regeocode': ('maps_regeocode', (('location', 'location', ''),), ('location',)),
+    'text_search': ('maps_text_search', (('query', 'query', ''), ('city', 'city', ''), ('types', 'types', '')), ('query',)),
+    'direction_driving': ('maps_direction_driving', (('origin', 'origin', ''), ('destination', 'destination', '')), ('origin', 'destination')),
+    'distance': ('maps_distance', (('origins', 'origin', ''), ('destination', 'destination', ''), ('type', 'type', '0')), ('origin', 'destination')),  # 0 for straight-line distance
+    'weather': ('maps_weather', (('city', 'city', ''),), ('city',)),
+    'search_detail': ('maps_search_detail', (('id', 'id', ''),), ('id',)),
+}
+AMAP_VALID_ACTIONS = frozenset(AMAP_ACTION_MAP)
+
+# Formatted Amap results keyed by normalized params, evicted least recently used first
+AMAP_CACHE_MAXSIZE = 1024
+# Time-sensitive actions expire after AMAP_CACHE_TTL seconds, the rest (address <-> coordinates, POI details) are kept
+AMAP_CACHE_TTL = 300
+AMAP_TTL_ACTIONS = frozenset({'weather', 'text_search', 'direction_driving'})
+amap_result_cache = OrderedDict()
+amap_result_cache_lock = threading.Lock()
+
+
+def get_cached_amap_result(cache_key: str):
+    """Return the cached formatted result for cache_key, or None on miss/expiry"""
+    with amap_result_cache_lock:
+        entry = amap_result_cache.get(cache_key)
+        if entry is None:
+            return None
+        expires_at, formatted_result = entry
+        if expires_at is not None and expires_at <= time.time():
+            del amap_result_cache[cache_key]
+            return None
+        amap_result_cache.move_to_end(cache_key)
+        return formatted_result
+
+
+def cache_amap_result(cache_key: str, action: str, formatted_result: str):
+    """Store a formatted result, applying the TTL for time-sensitive actions"""
+    expires_at = time.time() + AMAP_CACHE_TTL if action in AMAP_TTL_ACTIONS else None
+    with amap_result_cache_lock:
+        amap_result_cache[cache_key] = (expires_at, formatted_result)
+        amap_result_cache.move_to_end(cache_key)
+        while len(amap_result_cache) > AMAP_CACHE_MAXSIZE:
+            amap_result_cache.popitem(last=False)
+
+
+# Persistent POI detail cache, POI details change slowly so entries are reused for a week
+POI_DETAIL_CACHE_TTL = 7 * 24 * 3600
+poi_detail_conn = sqlite3.connect(os.path.join(ROOT_RESOURCE, 'laa_data.db'), check_same_thread=False)
+poi_detail_conn.execute('''
+    CREATE TABLE IF NOT EXISTS poi_detail_cache (
+        id TEXT PRIMARY KEY,
+        payload BLOB,
+        fetched_at INTEGER
+    )
+''')
+poi_detail_conn.commit()
+poi_detail_lock = threading.Lock()
+
+
+def get_cached_poi_detail(poi_id: str):
+    """Return the stored formatted detail for poi_id if it is younger than POI_DETAIL_CACHE_TTL"""
+    cutoff = int(time.time()) - POI_DETAIL_CACHE_TTL
+    with poi_detail_lock:
+        row = poi_detail_conn.execute(
+            'SELECT payload FROM poi_detail_cache WHERE id = ? AND fetched_at > ?',
+            (poi_id, cutoff)
+        ).fetchone()
+    return row[0] if row else None
+
+
+def cache_poi_detail(poi_id: str, formatted_result: str):
+    """Persist the formatted detail for poi_id"""
+    with poi_detail_lock:
+        poi_detail_conn.execute(
+            'INSERT OR REPLACE INTO poi_detail_cache (id, payload, fetched_at) VALUES (?, ?, ?)',
+            (poi_id, formatted_result, int(time.time()))
+        )
+        poi_detail_conn.commit()
+
+
 @register_tool('mcp_amap_maps')
 class MCPAmapMapsTool(BaseTool):
     """
@@ -1227,76 +1319,77 @@ class MCPAmapMapsTool(BaseTool):
         action = args['action']
         
         try:
-            # Select different map services according to action
-            if action == 'geocode':
-                # Address to coordinates
-                result = run_mcp(
-                    server_name='amap-maps',
-                    tool_name='maps_geo',
-                    args={
-                        'address': args.get('address', ''),
-                        'city': args.get('city', '')
-                    }
-                )
-            elif action == 'regeocode':
-                # Coordinates to address
-                result = run_mcp(
-                    server_name='amap-maps',
-                    tool_name='maps_regeocode',
-                    args={'location': args.get('location', '')}
-                )
-            elif action == 'text_search':
-                # Text search
-                result = run_mcp(
-                    server_name='amap-maps',
-                    tool_name='maps_text_search',
-                    args={
-                        'query': args.get('query', ''),
-                        'city': args.get('city', ''),
-                        'types': args.get('types', '')
-                    }
-                )
-            elif action == 'direction_driving':
-                # Driving navigation
-                result = run_mcp(
-                    server_name='amap-maps',
-                    tool_name='maps_direction_driving',
-                    args={
-                        'origin': args.get('origin', ''),
-                        'destination': args.get('destination', '')
-                    }
-                )
-            elif action == 'distance':
-                # Distance measurement
-                result = run_mcp(
-                    server_name='amap-maps',
-                    tool_name='maps_distance',
-                    args={
-                        'origins': args.get('origin', ''),
-                        'destination': args.get('destination', ''),
-                        'type': args.get('type', '0')  # 0 for straight-line distance
-                    }
-                )
-            elif action == 'weather':
-                # Map weather query
-                result = run_mcp(
-                    server_name='amap-maps',
-                    tool_name='maps_weather',
-                    args={'city': args.get('city', '')}
-                )
-            elif action == 'search_detail':
-                # Search details
-                result = run_mcp(
-                    server_name='amap-maps',
-                    tool_name='maps_search_detail',
-                    args={'id': args.get('id', '')}
-                )
-            else:
+            # Reject unknown actions (e.g. malformed LLM output) before any other work
+            if action not in AMAP_VALID_ACTIONS:
                 return f"Unsupported map operation type: {action}"
-            
-            return self.format_maps_result(action, result)
+
+            # Select different map services according to action
+            tool_name, arg_mapping, required = AMAP_ACTION_MAP[action]
+
+            # Fail fast on empty required arguments instead of spending a network round-trip
+            missing = [key for key in required if not args.get(key)]
+            if missing:
+                return f"Missing required parameter(s) for {action}: {', '.join(missing)}"
+
+            # Normalize params so key order variations hit the same cache slot
+            cache_key = json.dumps(args, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+            cached_result = get_cached_amap_result(cache_key)
+            if cached_result is not None:
+                return cached_result
+
+            call_args = {key: args.get(source, default) for key, source, default in arg_mapping}
+
+            # POI details survive restarts in the local database
+            poi_id = call_args['id'] if action == 'search_detail' else None
+            if poi_id:
+                stored_result = get_cached_poi_detail(poi_id)
+                if stored_result is not None:
+                    cache_amap_result(cache_key, action, stored_result)
+                    return stored_result
+
+            result = run_mcp(
+                server_name='amap-maps',
+                tool_name=tool_name,
+                args=call_args
+            )
+
+            formatted_result = self.format_maps_result(action, result)
+            # Only successful calls are cached so transient failures are retried
+            if isinstance(result, dict) and result.get('status') == 'success':
+                cache_amap_result(cache_key, action, formatted_result)
+                if poi_id:
+                    cache_poi_detail(poi_id, formatted_result)
+            return formatted_result
         except Exception as e:
             return f"Failed to call Amap MCP service: {str(e)}"
+
+    def batch_call(self, params_list: list) -> list:
+        """
+        Run several map calls concurrently, e.g. geocoding a list of addresses
+
+        At most AMAP_BATCH_MAX_WORKERS requests run at once. run_mcp additionally lets only
+        AMAP_API_QPS calls to the same Amap API start per AMAP_API_WINDOW seconds, so a large
+        same-action batch overlaps its round-trips within that quota and then proceeds at the
+        quota rate; mixed-action batches are limited per API.
+
+        Args:
+            params_list: List of JSON parameter strings, same format as call
+
+        Returns:
+            Formatted results in the same order as params_list
+        """
+        if not params_list:
+            return []
+
+        def safe_call(params: str) -> str:
+            try:
+                return self.call(params)
+            except Exception as e:
+                return f"Failed to call Amap MCP service: {str(e)}"
+
+        # Requests are I/O bound, so threads overlap the round-trips; run_mcp still enforces the per-API QPS quota
+        with ThreadPoolExecutor(max_workers=min(AMAP_BATCH_MAX_WORKERS, len(params_list))) as executor:
+            return list(executor.map(safe_call, params_list))
     
     def format_maps_result(self, action: str, result: dict) -> str:
         """Format map service result"""
@@ -1304,34 +1397,32 @@ class MCPAmapMapsTool(BaseTool):
             return f"No {action} information obtained"
         
         if isinstance(result, dict):
-            if result.get('status') == 'success':
-                data = result.get('data', {})
-                # Process real results
-                if action == 'text_search' and 'results' in data:
-                    results = data['results']
-                    if results:
-                        formatted_result = f"Search results (total {len(results)}):\n\n"
-                        for i, item in enumerate(results[:5], 1):  # Show at most first 5 results
-                            name = item.get('name', 'Unknown name')
-                            address = item.get('address', 'Address unknown')
-                            location = item.get('location', 'Location unknown')
-                            formatted_result += f"{i}. **{name}**\n"
-                            formatted_result += f"   Address: {address}\n"
-                            formatted_result += f"   Location: {location}\n\n"
-                        return formatted_result
-                    else:
-                        return "No related search results found"
-                elif action == 'search_detail' and data:
-                    # Process POI details
-                    formatted_result = "Location details:\n"
-                    for key, value in data.items():
-                        formatted_result += f"{key}: {value}\n"
-                    return formatted_result
-                else:
-                    # Generic JSON format output
-                    import json
-                    return json.dumps(data, ensure_ascii=False, indent=2)
-            else:
+            # Check status first so failed calls never touch the payload
+            if result.get('status') != 'success':
                 return f"Map service call failed: {result.get('message', 'Unknown error')}"
-        
+
+            data = result.get('data') or {}
+            # Process real results
+            if action == 'text_search':
+                results = data.get('results')
+                if results is not None:
+                    if not results:
+                        return "No related search results found"
+                    # Only the displayed POIs are walked, remaining entries are never read
+                    lines = [f"Search results (total {len(results)}):", ""]
+                    for i, item in enumerate(results[:5], 1):  # Show at most first 5 results
+                        lines.append(f"{i}. **{item.get('name', 'Unknown name')}**")
+                        lines.append(f"   Address: {item.get('address', 'Address unknown')}")
+                        lines.append(f"   Location: {item.get('location', 'Location unknown')}")
+                        lines.append("")
+                    # Trailing empty string keeps the final newline of the last entry
+                    lines.append("")
+                    return "\n".join(lines)
+            elif action == 'search_detail' and data:
+                # Process POI details
+                return "Location details:\n" + "".join(f"{key}: {value}\n" for key, value in data.items())
+
+            # Generic JSON format output
+            return json.dumps(data, ensure_ascii=False, indent=2)
+
         return str(result)
\ No newline at end of file
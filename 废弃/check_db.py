@@ -1,32 +1,43 @@
 import sqlite3
 import os
+import sys
+from contextlib import closing
+
+# 大表逐行打印时不按行刷新，减少write调用
+sys.stdout.reconfigure(line_buffering=False)
 
 # 数据库路径
 db_path = os.path.join('resource', 'laa_data.db')
 
 # 连接数据库
-conn = sqlite3.connect(db_path)
-cursor = conn.cursor()
-
-# 查看表
-cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-tables = cursor.fetchall()
-print("数据库中的表:", tables)
-
-# 查看任务表
-if ('tasks',) in tables:
-    cursor.execute("SELECT * FROM tasks")
-    tasks = cursor.fetchall()
-    print("\n任务表内容:")
-    for task in tasks:
-        print(task)
-
-# 查看笔记表
-if ('notes',) in tables:
-    cursor.execute("SELECT * FROM notes")
-    notes = cursor.fetchall()
-    print("\n笔记表内容:")
-    for note in notes:
-        print(note)
-
-conn.close()
\ No newline at end of file
+with closing(sqlite3.connect(db_path)) as conn:
+    cursor = conn.cursor()
+
+    # 查看表
+    table_names = {row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")}
+    print("数据库中的表:", sorted(table_names))
+
+    # 查看任务表（直接迭代游标，不把整表读入内存）
+    if 'tasks' in table_names:
+        cursor.execute("SELECT * FROM tasks")
+        print("\n任务表内容:")
+        for task in cursor:
+            print(task)
+
+    # 查看笔记表
+    if 'notes' in table_names:
+        cursor.execute("SELECT * FROM notes")
+        print("\n笔记表内容:")
+        for note in cursor:
+            print(note)
+
+    # 查看POI详情缓存表
+    if 'poi_detail_cache' in table_names:
+        cursor.execute("SELECT COUNT(*), MIN(fetched_at), MAX(fetched_at) FROM poi_detail_cache")
+        count, oldest, newest = cursor.fetchone()
+        print(f"\nPOI详情缓存: {count} 条, 最早缓存时间: {oldest}, 最新缓存时间: {newest}")
+        cursor.execute("SELECT id, fetched_at, length(payload) FROM poi_detail_cache ORDER BY fetched_at DESC")
+        for entry in cursor:
+            print(entry)
+
+sys.stdout.flush()
\ No newline at end of file
@@ -3,7 +3,9 @@
 基于Qwen Agent框架开发的个人助理系统
 """
 import os
+import sys
 import json
+import time
 import asyncio
 from typing import Optional, Dict, Any
 import dashscope
@@ -11,28 +13,405 @@ from qwen_agent.agents import Assistant
 from qwen_agent.gui import WebUI
 from qwen_agent.tools.base import BaseTool, register_tool
 import sqlite3
+import threading
+from contextlib import contextmanager
+import weakref
+import itertools
+import operator
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import requests
+from requests.adapters import HTTPAdapter
 import urllib.parse
 import matplotlib
 matplotlib.use('Agg')  # 使用非GUI后端
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+# 设置中文字体支持（导入时设置一次）
+plt.rcParams.update({
+    'font.sans-serif': ['SimHei', 'Microsoft YaHei', 'DejaVu Sans'],
+    'axes.unicode_minus': False,
+})
 import numpy as np
 import pandas as pd
-import io
-import base64
 
 
 # 配置 DashScope API Key
 dashscope.api_key = os.getenv('DASHSCOPE_API_KEY', '')
 dashscope.timeout = 30
 
+# 工具参数解析优先使用orjson，未安装时回退到标准库json
+# orjson.JSONDecodeError是json.JSONDecodeError的子类，原有的异常处理保持有效
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    json_loads = orjson.loads
+
+    def json_dumps_pretty(obj) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()
+
+    def json_dumps_compact(obj) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+else:
+    json_loads = json.loads
+
+    def json_dumps_pretty(obj) -> str:
+        return json.dumps(obj, ensure_ascii=False, indent=2)
+
+    def json_dumps_compact(obj) -> str:
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
 # 定义资源文件根目录
 ROOT_RESOURCE = os.path.join(os.path.dirname(__file__), 'resource')
 
 # 确保资源目录存在
 os.makedirs(ROOT_RESOURCE, exist_ok=True)
 
+# 图表保存目录，导入时创建一次
+CHARTS_DIR = os.path.join(ROOT_RESOURCE, 'charts')
+os.makedirs(CHARTS_DIR, exist_ok=True)
+
+# 图表文件编号：纳秒时间戳加进程内递增计数，同一秒内或程序重启后生成的图表都不会互相覆盖，
+# 时间戳也便于按生成时间排查
+_chart_counter = itertools.count()
+
+# 本地数据库文件路径
+_DB_PATH = os.path.join(ROOT_RESOURCE, 'laa_data.db')
+
+# 当前时间函数的模块级别名，省去每次调用时的属性查找
+_now = datetime.now
+
+# SQLite连接参数：NORMAL同步级别配合WAL减少fsync，临时表和页缓存放在内存中
+SQLITE_PRAGMAS = (
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-64000',
+    'PRAGMA mmap_size=268435456',
+)
+
+# 任务/笔记工具使用的固定SQL语句，配合连接的语句缓存只需解析一次
+# 笔记列表只需要内容摘要，截取在SQL中完成，避免把完整内容读入Python
+SQL_INSERT_TASK = 'INSERT INTO tasks (title, description) VALUES (?, ?)'
+SQL_SELECT_TASKS_PENDING = (
+    "SELECT id, title, description, created_at FROM tasks WHERE status = 'pending' ORDER BY id DESC LIMIT ?"
+)
+SQL_SELECT_TASKS_COMPLETED = (
+    "SELECT id, title, description, completed_at FROM tasks WHERE status = 'completed' ORDER BY id DESC LIMIT ?"
+)
+SQL_SELECT_TASKS_ALL = 'SELECT id, title, description, status, created_at FROM tasks ORDER BY id DESC LIMIT ?'
+SQL_DELETE_TASK = 'DELETE FROM tasks WHERE id = ?'
+SQL_INSERT_NOTE = 'INSERT INTO notes (title, content) VALUES (?, ?)'
+SQL_SEARCH_NOTES = (
+    'SELECT id, title, substr(content, 1, 50) AS snippet, updated_at FROM notes WHERE title LIKE ? OR content LIKE ? '
+    'ORDER BY id DESC LIMIT ?'
+)
+SQL_SEARCH_NOTES_FTS = (
+    'SELECT id, title, substr(content, 1, 50) AS snippet, updated_at FROM notes '
+    'WHERE id IN (SELECT rowid FROM notes_fts WHERE notes_fts MATCH ?) ORDER BY id DESC LIMIT ?'
+)
+SQL_LIST_NOTES = 'SELECT id, title, substr(content, 1, 50) AS snippet, updated_at FROM notes ORDER BY id DESC LIMIT ?'
+
+# 查看任务/笔记时默认返回的最大条数（最新的在前）
+VIEW_DEFAULT_LIMIT = 100
+
+
+def _parse_limit(value) -> int:
+    """
+    解析查看工具的limit参数，缺失、无法转换为整数或不是正数时使用默认值
+    """
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return VIEW_DEFAULT_LIMIT
+    return limit if limit > 0 else VIEW_DEFAULT_LIMIT
+
+
+# 列表行的格式化模板，预先绑定%格式化方法，循环中不再重复解析f-string
+_TASK_ROW_FMT = "ID: %d, 标题: %s, 状态: %s, 创建时间: %s".__mod__
+_TASK_ROW_FULL_FMT = "ID: %d, 标题: %s, 描述: %s, 状态: %s, 创建时间: %s".__mod__
+_NOTE_ROW_FMT = "ID: %d, 标题: %s, 内容: %s..., 更新时间: %s".__mod__
+
+# 火车票结果中每条车次需要展示的字段，一次取出全部字段
+TICKET_FIELDS = ('train_no', 'departure_time', 'arrival_time', 'price')
+_get_ticket = operator.itemgetter(*TICKET_FIELDS)
+
+
+def _ticket_fields(ticket: dict) -> tuple:
+    """
+    取出车次的展示字段，缺失的字段显示为N/A
+    """
+    try:
+        return _get_ticket(ticket)
+    except KeyError:
+        return tuple(ticket.get(field, 'N/A') for field in TICKET_FIELDS)
+
+# 数据库表结构，tasks.status上的索引用于按状态筛选任务
+SQL_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS tasks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        description TEXT,
+        status TEXT DEFAULT 'pending',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        completed_at TIMESTAMP NULL
+    );
+    CREATE TABLE IF NOT EXISTS notes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        content TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status);
+'''
+
+# 笔记全文索引：外部内容FTS5表引用notes，由触发器保持同步
+# 使用trigram分词器，中文关键词也能按子串匹配（关键词至少3个字符）
+SQL_NOTES_FTS = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+        title, content, content='notes', content_rowid='id', tokenize='trigram'
+    );
+    CREATE TRIGGER IF NOT EXISTS notes_fts_ai AFTER INSERT ON notes BEGIN
+        INSERT INTO notes_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END;
+    CREATE TRIGGER IF NOT EXISTS notes_fts_ad AFTER DELETE ON notes BEGIN
+        INSERT INTO notes_fts(notes_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+    END;
+    CREATE TRIGGER IF NOT EXISTS notes_fts_au AFTER UPDATE ON notes BEGIN
+        INSERT INTO notes_fts(notes_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO notes_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END;
+'''
+NOTES_FTS_MIN_KEYWORD = 3
+
+# 更新任务时所有可能的字段组合预先生成UPDATE语句，字段顺序与UPDATE_TASK_COLUMNS一致
+UPDATE_TASK_COLUMNS = ('status', 'completed_at', 'title', 'description')
+SQL_UPDATE_TASK = {
+    frozenset(columns): f"UPDATE tasks SET {', '.join(f'{column} = ?' for column in columns)} WHERE id = ?"
+    for count in range(1, len(UPDATE_TASK_COLUMNS) + 1)
+    for columns in itertools.combinations(UPDATE_TASK_COLUMNS, count)
+}
+
+
+# 线程本地连接池：同一线程内的工具调用复用一个连接，避免反复连接并保留页缓存
+_POOL = threading.local()
+
+
+class _ConnHolder:
+    """
+    线程本地连接的持有者，线程结束时随线程本地数据一起释放
+    """
+    def __init__(self, conn):
+        self.conn = conn
+
+# SQLite是否支持FTS5 trigram分词，由_init_db检测；不支持时笔记搜索退回LIKE
+_NOTES_FTS = False
+
+
+def _get_conn():
+    """
+    获取当前线程复用的数据库连接，首次调用时创建并应用性能参数
+    """
+    holder = getattr(_POOL, 'holder', None)
+    if holder is None:
+        # 连接可能在进程退出时由主线程关闭，因此不限制使用线程
+        conn = sqlite3.connect(_DB_PATH, cached_statements=256, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for pragma in SQLITE_PRAGMAS:
+            conn.execute(pragma)
+        holder = _POOL.holder = _ConnHolder(conn)
+        # 线程结束、持有者被回收时关闭连接；进程退出时仍未关闭的连接由finalize统一关闭
+        weakref.finalize(holder, conn.close)
+    return holder.conn
+
+
+def _init_db():
+    """
+    数据库一次性初始化：切换为WAL日志模式，读操作不再被写操作阻塞
+    WAL模式保存在数据库文件中，之后新建的连接会自动沿用
+    同时建表、建索引，并创建笔记的全文索引
+    """
+    global _NOTES_FTS
+    conn = _get_conn()
+    journal_mode = conn.execute('PRAGMA journal_mode=WAL').fetchone()[0]
+    if journal_mode.lower() != 'wal':
+        print(f"警告: 数据库未能切换到WAL模式，当前模式: {journal_mode}")
+    
+    conn.executescript(SQL_SCHEMA)
+    
+    fts_exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'notes_fts'").fetchone()
+    try:
+        conn.executescript(SQL_NOTES_FTS)
+    except sqlite3.OperationalError as e:
+        print(f"警告: 无法创建笔记全文索引，笔记搜索将使用LIKE匹配: {e}")
+        return
+    if fts_exists is None:
+        # 首次创建全文索引时为已有笔记建立索引
+        with conn:
+            conn.execute("INSERT INTO notes_fts(notes_fts) VALUES ('rebuild')")
+    _NOTES_FTS = True
+
+
+_init_db()
+
+
+@contextmanager
+def _tx():
+    """
+    在当前线程复用的连接上开启事务，正常退出时提交，异常时回滚
+    嵌套使用时内层以SAVEPOINT实现：内层异常只回滚内层的写操作，只有最外层提交
+    """
+    conn = _get_conn()
+    depth = getattr(_POOL, 'tx_depth', 0)
+    savepoint = f'tx_{depth}'
+    if depth == 0:
+        # 显式开启事务，保证内层SAVEPOINT嵌套在同一事务中，而不是各自提交
+        if not conn.in_transaction:
+            conn.execute('BEGIN')
+    else:
+        conn.execute(f'SAVEPOINT {savepoint}')
+    _POOL.tx_depth = depth + 1
+    try:
+        yield conn
+    except BaseException:
+        if depth == 0:
+            conn.rollback()
+        else:
+            conn.execute(f'ROLLBACK TO SAVEPOINT {savepoint}')
+            conn.execute(f'RELEASE SAVEPOINT {savepoint}')
+        raise
+    else:
+        if depth == 0:
+            conn.commit()
+        else:
+            conn.execute(f'RELEASE SAVEPOINT {savepoint}')
+    finally:
+        _POOL.tx_depth = depth
+
+# 模块级HTTP会话：复用到高德API的TCP/TLS连接（keep-alive），避免每次查询重新握手
+_HTTP = requests.Session()
+_HTTP.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=10))
+
+# 复用的图表画布：直接使用Agg画布绘制和输出PNG，绕过pyplot的全局图形管理，
+# 避免每次调用都重新创建Figure；多线程调用时由_FIG_LOCK串行化
+# 使用constrained布局，保存时一次完成布局计算，防止标签被截断
+_FIG = Figure(figsize=(10, 6), layout='constrained')
+_CANVAS = FigureCanvasAgg(_FIG)
+_FIG_LOCK = threading.Lock()
+
+# PNG编码参数：图表以纯色块为主，较低的zlib压缩级别编码更快，文件体积增加很少
+_PNG_PIL_KWARGS = {'compress_level': 3, 'optimize': False}
+
+# ChartTool支持的输出格式及对应的Pillow编码参数；WebP体积明显小于PNG，编码也更快
+CHART_FORMATS = {
+    'webp': {'quality': 90, 'method': 4},
+    'png': _PNG_PIL_KWARGS,
+}
+
+
+def _new_chart_axes():
+    """
+    清空复用的Figure并重新创建坐标轴，上一次绘图留下的坐标轴状态
+    （饼图的等比例坐标和隐藏的边框、旋转的刻度标签等）全部丢弃
+    调用方需持有_FIG_LOCK
+    """
+    _FIG.clf()
+    return _FIG.add_subplot(111)
+
+
+# 饼图中占比低于该比例的扇区合并为“其他”
+PIE_MIN_FRACTION = 0.01
+
+
+def _merge_small_slices(labels: list, values: np.ndarray):
+    """
+    将饼图中占比过小的扇区合并为一个“其他”扇区，减少绘制的扇区数量
+    """
+    if values.sum() <= 0:
+        return labels, values
+    small = _normalize(values) < PIE_MIN_FRACTION
+    if np.count_nonzero(small) < 2:
+        return labels, values
+    kept = ~small
+    merged_labels = [label for label, keep in zip(labels, kept) if keep]
+    merged_labels.append('其他')
+    return merged_labels, np.append(values[kept], values[small].sum())
+
+# DataStatisticsTool文档中约定的数据格式：[{"name": ..., "value": 数值}]
+_NAME_VALUE_KEYS = frozenset({'name', 'value'})
+
+# DataStatisticsTool在数据中没有数值列时各分析类型的提示
+_NO_NUMERIC_MESSAGES = {
+    'summary': "未找到数值型数据进行统计分析\n\n",
+    'distribution': "未找到数值型数据进行分布分析\n\n",
+    'comparison': "数据比较分析：\n未找到数值型数据进行比较分析\n\n",
+}
+
+# 按列统计的均值/标准差/最小值/最大值：安装了numba时编译为单次遍历的Welford内核，
+# 否则使用NumPy的逐项归约；两者都忽略NaN，标准差使用样本标准差（ddof=1）
+# _normalize将数值换算为占总和的比例（总和为0时原样返回），用于饼图扇区占比
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+if njit is not None:
+    @njit(cache=True)
+    def _fused_stats(arr):
+        n_rows, n_cols = arr.shape
+        counts = np.zeros(n_cols, dtype=np.int64)
+        means = np.zeros(n_cols)
+        m2 = np.zeros(n_cols)
+        mins = np.full(n_cols, np.inf)
+        maxs = np.full(n_cols, -np.inf)
+        for i in range(n_rows):
+            for j in range(n_cols):
+                x = arr[i, j]
+                if np.isnan(x):
+                    continue
+                counts[j] += 1
+                delta = x - means[j]
+                means[j] += delta / counts[j]
+                m2[j] += delta * (x - means[j])
+                if x < mins[j]:
+                    mins[j] = x
+                if x > maxs[j]:
+                    maxs[j] = x
+        stds = np.full(n_cols, np.nan)
+        for j in range(n_cols):
+            if counts[j] == 0:
+                means[j] = np.nan
+                mins[j] = np.nan
+                maxs[j] = np.nan
+            elif counts[j] > 1:
+                stds[j] = np.sqrt(m2[j] / (counts[j] - 1))
+        return means, stds, mins, maxs
+
+    @njit(cache=True)
+    def _normalize(values):
+        total = 0.0
+        for x in values:
+            total += x
+        if total == 0.0:
+            return values
+        return values / total
+else:
+    def _fused_stats(arr):
+        return (
+            np.nanmean(arr, axis=0),
+            np.nanstd(arr, axis=0, ddof=1),
+            np.nanmin(arr, axis=0),
+            np.nanmax(arr, axis=0),
+        )
+
+    def _normalize(values):
+        total = values.sum()
+        return values / total if total else values
+
 
 # ====== 任务管理工具实现 ======
 @register_tool('create_task')
@@ -54,26 +433,59 @@ class CreateTaskTool(BaseTool):
     }]
 
     def call(self, params: str, **kwargs) -> str:
-        import json
-        args = json.loads(params)
+        args = json_loads(params)
         title = args['title']
         description = args.get('description', '')
         
-        # 连接数据库并创建任务
-        db_path = os.path.join(ROOT_RESOURCE, 'laa_data.db')
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            'INSERT INTO tasks (title, description) VALUES (?, ?)',
-            (title, description)
-        )
-        task_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        # 在事务中创建任务
+        with _tx() as conn:
+            cursor = conn.execute(SQL_INSERT_TASK, (title, description))
+            task_id = cursor.lastrowid
         
         return f"任务创建成功！任务ID: {task_id}, 标题: {title}"
 
+    @classmethod
+    def create_many(cls, items: list) -> int:
+        """
+        在一个事务中批量创建任务，只提交一次，返回创建的任务数量
+        """
+        rows = [(item['title'], item.get('description', '')) for item in items]
+        with _tx() as conn:
+            conn.executemany(SQL_INSERT_TASK, rows)
+        return len(rows)
+
+
+@register_tool('create_tasks_batch')
+class CreateTasksBatchTool(BaseTool):
+    """
+    批量创建任务工具
+    """
+    description = '一次创建多个待办任务'
+    parameters = [{
+        'name': 'tasks',
+        'type': 'array',
+        'description': '要创建的任务列表，例如：[{"title": "任务A", "description": "描述A"}, {"title": "任务B"}]',
+        'required': True
+    }]
+
+    def call(self, params: str, **kwargs) -> str:
+        args = json_loads(params)
+        tasks = args.get('tasks', [])
+        
+        if not tasks or not isinstance(tasks, list):
+            return "错误：请提供有效的任务列表"
+        
+        for index, item in enumerate(tasks, 1):
+            if not (
+                isinstance(item, dict)
+                and isinstance(item.get('title'), str) and item['title']
+                and isinstance(item.get('description', ''), str)
+            ):
+                return f"错误：第{index}个任务格式不正确，需要包含非空的title字段，description需为字符串"
+        
+        count = CreateTaskTool.create_many(tasks)
+        return f"批量创建任务成功！共创建 {count} 个任务"
+
 
 @register_tool('view_tasks')
 class ViewTasksTool(BaseTool):
@@ -86,39 +498,42 @@ class ViewTasksTool(BaseTool):
         'type': 'string',
         'description': '任务状态(pending/completed/all)',
         'required': False
+    }, {
+        'name': 'limit',
+        'type': 'integer',
+        'description': f'最多返回的任务数量，默认{VIEW_DEFAULT_LIMIT}',
+        'required': False
     }]
 
     def call(self, params: str, **kwargs) -> str:
-        import json
-        args = json.loads(params)
+        args = json_loads(params)
         status = args.get('status', 'all')
+        limit = _parse_limit(args.get('limit'))
         
         # 连接数据库并查询任务
-        db_path = os.path.join(ROOT_RESOURCE, 'laa_data.db')
-        conn = sqlite3.connect(db_path)
+        conn = _get_conn()
         cursor = conn.cursor()
         
         if status == 'pending':
-            cursor.execute('SELECT id, title, description, created_at FROM tasks WHERE status = "pending"')
+            cursor.execute(SQL_SELECT_TASKS_PENDING, (limit,))
         elif status == 'completed':
-            cursor.execute('SELECT id, title, description, completed_at FROM tasks WHERE status = "completed"')
+            cursor.execute(SQL_SELECT_TASKS_COMPLETED, (limit,))
         else:
-            cursor.execute('SELECT id, title, description, status, created_at FROM tasks')
+            cursor.execute(SQL_SELECT_TASKS_ALL, (limit,))
         
         tasks = cursor.fetchall()
-        conn.close()
         
         if not tasks:
             return "暂无任务"
         
-        result = "任务列表：\n"
+        parts = ["任务列表："]
         for task in tasks:
             if len(task) == 4:
-                result += f"ID: {task[0]}, 标题: {task[1]}, 状态: {task[3]}, 创建时间: {task[2]}\n"
+                parts.append(_TASK_ROW_FMT((task[0], task[1], task[3], task[2])))
             else:
-                result += f"ID: {task[0]}, 标题: {task[1]}, 描述: {task[2]}, 状态: {task[3]}, 创建时间: {task[4]}\n"
+                parts.append(_TASK_ROW_FULL_FMT(tuple(task)))
         
-        return result
+        return "\n".join(parts)
 
 
 @register_tool('update_task')
@@ -150,45 +565,39 @@ class UpdateTaskTool(BaseTool):
     }]
 
     def call(self, params: str, **kwargs) -> str:
-        import json
-        args = json.loads(params)
+        args = json_loads(params)
         task_id = args['task_id']
         
-        # 构建更新字段
+        # 构建更新字段（按UPDATE_TASK_COLUMNS的顺序添加，与预生成语句的占位符顺序一致）
         updates = []
         update_values = []
         
         if 'status' in args:
-            updates.append('status = ?')
+            updates.append('status')
             update_values.append(args['status'])
             if args['status'] == 'completed':
-                updates.append('completed_at = ?')
-                update_values.append(datetime.now().isoformat())
+                updates.append('completed_at')
+                update_values.append(_now().isoformat())
         
         if 'title' in args:
-            updates.append('title = ?')
+            updates.append('title')
             update_values.append(args['title'])
         
         if 'description' in args:
-            updates.append('description = ?')
+            updates.append('description')
             update_values.append(args['description'])
         
         if not updates:
             return "未提供任何更新字段"
         
-        # 连接数据库并更新任务
-        db_path = os.path.join(ROOT_RESOURCE, 'laa_data.db')
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        query = f"UPDATE tasks SET {', '.join(updates)} WHERE id = ?"
+        query = SQL_UPDATE_TASK[frozenset(updates)]
         update_values.append(task_id)
         
-        cursor.execute(query, update_values)
-        conn.commit()
+        # 在事务中更新任务
+        with _tx() as conn:
+            cursor = conn.execute(query, update_values)
         
         rows_affected = cursor.rowcount
-        conn.close()
         
         if rows_affected > 0:
             return f"任务 {task_id} 更新成功"
@@ -210,20 +619,14 @@ class DeleteTaskTool(BaseTool):
     }]
 
     def call(self, params: str, **kwargs) -> str:
-        import json
-        args = json.loads(params)
+        args = json_loads(params)
         task_id = args['task_id']
         
-        # 连接数据库并删除任务
-        db_path = os.path.join(ROOT_RESOURCE, 'laa_data.db')
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
-        conn.commit()
+        # 在事务中删除任务
+        with _tx() as conn:
+            cursor = conn.execute(SQL_DELETE_TASK, (task_id,))
         
         rows_affected = cursor.rowcount
-        conn.close()
         
         if rows_affected > 0:
             return f"任务 {task_id} 删除成功"
@@ -251,26 +654,59 @@ class CreateNoteTool(BaseTool):
     }]
 
     def call(self, params: str, **kwargs) -> str:
-        import json
-        args = json.loads(params)
+        args = json_loads(params)
         title = args['title']
         content = args['content']
         
-        # 连接数据库并创建笔记
-        db_path = os.path.join(ROOT_RESOURCE, 'laa_data.db')
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            'INSERT INTO notes (title, content) VALUES (?, ?)',
-            (title, content)
-        )
-        note_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        # 在事务中创建笔记
+        with _tx() as conn:
+            cursor = conn.execute(SQL_INSERT_NOTE, (title, content))
+            note_id = cursor.lastrowid
         
         return f"笔记创建成功！笔记ID: {note_id}, 标题: {title}"
 
+    @classmethod
+    def create_many(cls, items: list) -> int:
+        """
+        在一个事务中批量创建笔记，只提交一次，返回创建的笔记数量
+        """
+        rows = [(item['title'], item['content']) for item in items]
+        with _tx() as conn:
+            conn.executemany(SQL_INSERT_NOTE, rows)
+        return len(rows)
+
+
+@register_tool('create_notes_batch')
+class CreateNotesBatchTool(BaseTool):
+    """
+    批量创建笔记工具
+    """
+    description = '一次创建多个笔记'
+    parameters = [{
+        'name': 'notes',
+        'type': 'array',
+        'description': '要创建的笔记列表，例如：[{"title": "笔记A", "content": "内容A"}, {"title": "笔记B", "content": "内容B"}]',
+        'required': True
+    }]
+
+    def call(self, params: str, **kwargs) -> str:
+        args = json_loads(params)
+        notes = args.get('notes', [])
+        
+        if not notes or not isinstance(notes, list):
+            return "错误：请提供有效的笔记列表"
+        
+        for index, item in enumerate(notes, 1):
+            if not (
+                isinstance(item, dict)
+                and isinstance(item.get('title'), str) and item['title']
+                and isinstance(item.get('content'), str)
+            ):
+                return f"错误：第{index}个笔记格式不正确，需要包含非空的title字段和字符串类型的content字段"
+        
+        count = CreateNoteTool.create_many(notes)
+        return f"批量创建笔记成功！共创建 {count} 个笔记"
+
 
 @register_tool('view_notes')
 class ViewNotesTool(BaseTool):
@@ -283,37 +719,41 @@ class ViewNotesTool(BaseTool):
         'type': 'string',
         'description': '搜索关键词，根据标题或内容搜索',
         'required': False
+    }, {
+        'name': 'limit',
+        'type': 'integer',
+        'description': f'最多返回的笔记数量，默认{VIEW_DEFAULT_LIMIT}',
+        'required': False
     }]
 
     def call(self, params: str, **kwargs) -> str:
-        import json
-        args = json.loads(params)
+        args = json_loads(params)
         keyword = args.get('keyword', '')
+        limit = _parse_limit(args.get('limit'))
         
         # 连接数据库并查询笔记
-        db_path = os.path.join(ROOT_RESOURCE, 'laa_data.db')
-        conn = sqlite3.connect(db_path)
+        conn = _get_conn()
         cursor = conn.cursor()
         
-        if keyword:
-            cursor.execute(
-                'SELECT id, title, content, updated_at FROM notes WHERE title LIKE ? OR content LIKE ?',
-                (f'%{keyword}%', f'%{keyword}%')
-            )
+        if keyword and _NOTES_FTS and len(keyword) >= NOTES_FTS_MIN_KEYWORD:
+            # 关键词作为短语查询全文索引，双引号需转义
+            cursor.execute(SQL_SEARCH_NOTES_FTS, ('"' + keyword.replace('"', '""') + '"', limit))
+        elif keyword:
+            # trigram索引无法匹配过短的关键词，退回LIKE扫描
+            cursor.execute(SQL_SEARCH_NOTES, (f'%{keyword}%', f'%{keyword}%', limit))
         else:
-            cursor.execute('SELECT id, title, content, updated_at FROM notes')
+            cursor.execute(SQL_LIST_NOTES, (limit,))
         
         notes = cursor.fetchall()
-        conn.close()
         
         if not notes:
             return "暂无笔记"
         
-        result = "笔记列表：\n"
+        parts = ["笔记列表："]
         for note in notes:
-            result += f"ID: {note[0]}, 标题: {note[1]}, 内容: {note[2][:50]}..., 更新时间: {note[3]}\n"
+            parts.append(_NOTE_ROW_FMT(tuple(note)))
         
-        return result
+        return "\n".join(parts)
 
 
 # ====== 天气查询工具实现 ======
@@ -331,8 +771,7 @@ class WeatherTool(BaseTool):
     }]
 
     def call(self, params: str, **kwargs) -> str:
-        import json
-        args = json.loads(params)
+        args = json_loads(params)
         location = args['location']
         
         return self.get_weather_from_gaode(location)
@@ -353,9 +792,9 @@ class WeatherTool(BaseTool):
         }
         
         try:
-            response = requests.get(base_url, params=params)
+            response = _HTTP.get(base_url, params=params, timeout=5)
             if response.status_code == 200:
-                data = response.json()
+                data = json_loads(response.content)
                 if data.get('status') == '1' and data.get('lives'):
                     weather_info = data['lives'][0]
                     # 确保时间格式完整
@@ -369,7 +808,7 @@ class WeatherTool(BaseTool):
                         formatted_time = report_time.rstrip(':')
                     else:
                         # 没有时间或格式异常，使用当前时间
-                        formatted_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                        formatted_time = _now().strftime('%Y-%m-%d %H:%M:%S')
                     
                     result = f"天气查询结果：\n城市：{weather_info.get('city')}\n天气：{weather_info.get('weather')}\n温度：{weather_info.get('temperature')}°C\n风向：{weather_info.get('winddirection')}\n风力：{weather_info.get('windpower')}\n湿度：{weather_info.get('humidity')}%\n发布时间：{formatted_time}"
                     return result
@@ -395,10 +834,9 @@ class BingSearchTool(BaseTool):
     }]
 
     def call(self, params: str, **kwargs) -> str:
-        import json
         try:
             # 解析参数
-            args = json.loads(params)
+            args = json_loads(params)
             query = args['query']
             
             # 调用Bing MCP服务进行网络搜索
@@ -408,10 +846,13 @@ class BingSearchTool(BaseTool):
                 args={"query": query, "num_results": 5}
             )
             
-            # 处理MCP服务返回的结果            if result.get('status') == 'success':
+            # 处理MCP服务返回的结果
+            if result.get('status') == 'success':
                 # 在Trae AI环境中，run_mcp会自动被替换为真实的服务调用
-                # 我们直接返回结果，让系统处理实际的调用                if 'is_mcp_request' in result.get('data', {}):
-                    # 这是在模拟环境中，我们构造一个示例响应                    formatted_result = f"已发送搜索请求到Bing MCP服务 (关于 '{query}')。\\n"
+                # 我们直接返回结果，让系统处理实际的调用
+                if 'is_mcp_request' in result.get('data', {}):
+                    # 这是在模拟环境中，我们构造一个示例响应
+                    formatted_result = f"已发送搜索请求到Bing MCP服务 (关于 '{query}')。\\n"
                     formatted_result += "在实际环境中，您将收到以下格式的搜索结果：\\n\\n"
                     formatted_result += "1. **示例标题**\\n"
                     formatted_result += "   描述: 这是示例描述内容\\n"
@@ -419,7 +860,8 @@ class BingSearchTool(BaseTool):
                     formatted_result += "在Trae AI环境中，系统会自动拦截并使用真实的MCP服务获取实际搜索结果。"
                     return formatted_result
                 else:
-                    # 处理真实的搜索结果                    search_results = result.get('data', {}).get('results', [])
+                    # 处理真实的搜索结果
+                    search_results = result.get('data', {}).get('results', [])
                     if search_results:
                         formatted_result = f"搜索结果 (关于 '{query}')：\\n\\n"
                         for i, item in enumerate(search_results, 1):
@@ -452,10 +894,9 @@ class SearchAttractionsTool(BaseTool):
     }]
 
     def call(self, params: str, **kwargs) -> str:
-        import json
         
         # 解析参数
-        args = json.loads(params)
+        args = json_loads(params)
         location = args.get('location', '').strip()
         
         if not location:
@@ -469,55 +910,56 @@ class SearchAttractionsTool(BaseTool):
                 args={"query": f"{location} 景点", "city": location, "types": "旅游景点"}
             )
             
-            # 处理MCP服务返回的结果            if result.get('status') == 'success':
+            # 处理MCP服务返回的结果
+            if result.get('status') == 'success':
+                result_data = result.get('data') or {}
                 # 在Trae AI环境中，run_mcp会自动被替换为真实的服务调用
-                if 'is_mcp_request' in result.get('data', {}):
+                if 'is_mcp_request' in result_data:
                     # 这是在模拟环境中
                     formatted_result = f"已发送景点搜索请求到高德地图MCP服务 (关于 '{location} 景点')。\n"
                     formatted_result += "在实际环境中，您将收到实际的景点搜索结果。"
                     return formatted_result
                 else:
-                    # 处理真实的搜索结果                    attractions_data = result.get('data', {}).get('results', [])
+                    # 处理真实的搜索结果
+                    attractions_data = result_data.get('results', [])
                     
                     if attractions_data:
-                        result_text = f"{location}的热门景点信息：\n\n"
+                        parts = [f"{location}的热门景点信息：\n\n"]
+                        attractions = attractions_data[:5]
+                        
+                        # 并发获取景点详情（可能包含图片），总耗时接近单次请求而不是逐个累加
+                        poi_ids = [attraction.get('id', '') for attraction in attractions]
+                        with ThreadPoolExecutor(max_workers=len(poi_ids)) as executor:
+                            detail_results = list(executor.map(self._get_attraction_detail, poi_ids))
                         
-                        # 处理每个景点                        for i, attraction in enumerate(attractions_data[:5], 1):
-                            poi_id = attraction.get('id', '')
+                        # 处理每个景点
+                        for i, (attraction, detail_result) in enumerate(zip(attractions, detail_results), 1):
                             name = attraction.get('name', '未知景点')
                             address = attraction.get('address', '地址不详')
                             
-                            # 尝试获取景点详情（可能包含图片）
-                            detail_result = None
-                            if poi_id:
-                                detail_result = run_mcp(
-                                    server_name="amap-maps",
-                                    tool_name="maps_search_detail",
-                                    args={"id": poi_id}
-                                )
-                            
                             # 构建景点信息
-                            result_text += f"{i}. **{name}**\n"
-                            result_text += f"   地址: {address}\n"
+                            parts.append(f"{i}. **{name}**\n")
+                            parts.append(f"   地址: {address}\n")
                             
-                            # 添加图片信息
-                            if detail_result and detail_result.get('status') == 'success':
-                                detail_data = detail_result.get('data', {})
-                                if detail_data and 'photos' in detail_data:
-                                    photos = detail_data['photos'][:2]  # 最多显示2张图片                                    for j, photo in enumerate(photos, 1):
-                                        photo_url = photo.get('url', '')
-                                        if photo_url:
-                                            # 使用Markdown图片格式，以便WebUI组件能正确渲染                                            result_text += f"   图片{j}: ![{name}图片{j}]({photo_url})\n"
-                                        else:
-                                            result_text += "   图片: 图片链接不可用\n"
-                                else:
-                                    result_text += "   图片: 暂未获取到图片信息\n"
+                            # 添加图片信息（详情请求失败时按无图片处理）
+                            detail_data = (
+                                detail_result.get('data') if detail_result and detail_result.get('status') == 'success' else None
+                            ) or {}
+                            photos = detail_data.get('photos')
+                            if photos is not None:
+                                for j, photo in enumerate(photos[:2], 1):  # 最多显示2张图片
+                                    photo_url = photo.get('url')
+                                    if photo_url:
+                                        # 使用Markdown图片格式，以便WebUI组件能正确渲染
+                                        parts.append(f"   图片{j}: ![{name}图片{j}]({photo_url})\n")
+                                    else:
+                                        parts.append("   图片: 图片链接不可用\n")
                             else:
-                                result_text += "   图片: 暂未获取到图片信息\n"
+                                parts.append("   图片: 暂未获取到图片信息\n")
                             
-                            result_text += "\n"
+                            parts.append("\n")
                         
-                        return result_text
+                        return "".join(parts)
                     else:
                         return f"未找到{location}的景点信息，请尝试使用其他关键词搜索"
             else:
@@ -527,6 +969,16 @@ class SearchAttractionsTool(BaseTool):
             return "错误：参数格式无效，请提供有效的JSON格式参数"
         except Exception as e:
             return f"搜索失败：{str(e)}"
+    
+    def _get_attraction_detail(self, poi_id: str):
+        """获取单个景点的详情，没有POI ID时返回None"""
+        if not poi_id:
+            return None
+        return run_mcp(
+            server_name="amap-maps",
+            tool_name="maps_search_detail",
+            args={"id": poi_id}
+        )
 
 
 @register_tool('data_statistics')
@@ -553,9 +1005,8 @@ class DataStatisticsTool(BaseTool):
     }]
 
     def call(self, params: str, **kwargs) -> str:
-        import json
         try:
-            args = json.loads(params)
+            args = json_loads(params)
             data = args.get('data', [])
             analysis_type = args.get('analysis_type', 'summary')
             chart_type = args.get('chart_type', 'bar')
@@ -563,87 +1014,102 @@ class DataStatisticsTool(BaseTool):
             if not data or not isinstance(data, list):
                 return "错误：请提供有效的数据数组"
             
-            # 转换数据为DataFrame便于分析
-            df = pd.DataFrame(data)
+            df = None
+            names = values = None
+            if all(
+                isinstance(item, dict) and item.keys() == _NAME_VALUE_KEYS and type(item['value']) in (int, float)
+                for item in data
+            ):
+                # 常见的name/value格式直接提取为列表和数组，跳过DataFrame的构建和类型推断
+                names = [item['name'] for item in data]
+                values = np.fromiter((item['value'] for item in data), dtype=np.float64, count=len(data))
+                numeric_cols = ['value']
+                arr = values[:, np.newaxis]
+            else:
+                # 其他格式转换为DataFrame便于分析
+                df = pd.DataFrame(data)
+                # 数值列只识别一次，各分析分支共用同一份数值数组
+                numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+                arr = df[numeric_cols].to_numpy(dtype=np.float64) if numeric_cols else None
             
             # 执行统计分析
             result = "数据统计分析结果：\n\n"
             
-            if analysis_type == 'summary':
-                # 基本统计汇总                numeric_cols = df.select_dtypes(include=[np.number]).columns
-                if len(numeric_cols) > 0:
-                    summary = df[numeric_cols].describe()
-                    result += f"基本统计信息：\n{summary}\n\n"
-                else:
-                    result += "未找到数值型数据进行统计分析\n\n"
-            
-            elif analysis_type == 'distribution':
-                # 分布分析
-                numeric_cols = df.select_dtypes(include=[np.number]).columns
-                if len(numeric_cols) > 0:
-                    for col in numeric_cols:
-                        result += f"{col}的分布统计：\n"
-                        result += f"  均值: {df[col].mean():.2f}
-"
-                        result += f"  中位数: {df[col].median():.2f}
-"
-                        result += f"  标准差: {df[col].std():.2f}\n\n"
-                else:
-                    result += "未找到数值型数据进行分布分析\n\n"
-            
-            elif analysis_type == 'comparison':
-                # 比较分析
-                result += "数据比较分析：\n"
-                numeric_cols = df.select_dtypes(include=[np.number]).columns
-                if len(numeric_cols) > 0:
-                    for col in numeric_cols:
-                        result += f"{col}列：\n"
-                        result += f"  最大值: {df[col].max():.2f}\n"
-                        result += f"  最小值: {df[col].min():.2f}"
-                        result += f"  极差: {df[col].max() - df[col].min():.2f}\n\n"
-                else:
-                    result += "未找到数值型数据进行比较分析\n\n"
+            if arr is None:
+                # 没有数值列时直接给出提示，不进入各分析分支
+                result += _NO_NUMERIC_MESSAGES.get(analysis_type, "")
+            else:
+                # 在二维数组上一次性按列归约，代替describe()的逐列计算和格式化
+                if analysis_type == 'summary':
+                    # 基本统计汇总
+                    counts = np.count_nonzero(~np.isnan(arr), axis=0)
+                    means = np.nanmean(arr, axis=0)
+                    stds = np.nanstd(arr, axis=0, ddof=1)
+                    mins = np.nanmin(arr, axis=0)
+                    q25, q50, q75 = np.nanpercentile(arr, [25, 50, 75], axis=0)
+                    maxs = np.nanmax(arr, axis=0)
+                    lines = [
+                        f"{col}: 数量 {counts[i]}, 均值 {means[i]:.2f}, 标准差 {stds[i]:.2f}, 最小值 {mins[i]:.2f}, "
+                        f"25% {q25[i]:.2f}, 中位数 {q50[i]:.2f}, 75% {q75[i]:.2f}, 最大值 {maxs[i]:.2f}"
+                        for i, col in enumerate(numeric_cols)
+                    ]
+                    result += "基本统计信息：\n" + "\n".join(lines) + "\n\n"
+                
+                elif analysis_type == 'distribution':
+                    # 分布分析
+                    means, stds, _, _ = _fused_stats(arr)
+                    medians = np.nanmedian(arr, axis=0)
+                    result += "\n".join(
+                        f"{col}的分布统计：\n  均值: {means[i]:.2f}\n  中位数: {medians[i]:.2f}\n  标准差: {stds[i]:.2f}\n"
+                        for i, col in enumerate(numeric_cols)
+                    ) + "\n"
+                
+                elif analysis_type == 'comparison':
+                    # 比较分析
+                    _, _, mins, maxs = _fused_stats(arr)
+                    result += "数据比较分析：\n" + "\n".join(
+                        f"{col}列：\n  最大值: {maxs[i]:.2f}\n  最小值: {mins[i]:.2f}\n  极差: {maxs[i] - mins[i]:.2f}\n"
+                        for i, col in enumerate(numeric_cols)
+                    ) + "\n"
             
             # 生成图表
             try:
+                if df is not None and 'value' in df.columns:
+                    names, values = df['name'], df['value']
+                
                 # 确保有用于绘图的数据
-                if 'value' in df.columns:
-                    # 创建图表目录
-                    charts_dir = os.path.join(ROOT_RESOURCE, 'charts')
-                    os.makedirs(charts_dir, exist_ok=True)
-                    
-                    # 生成图表
-                    plt.figure(figsize=(10, 6))
-                    
-                    if chart_type == 'bar':
-                        plt.bar(df['name'], df['value'])
-                        plt.title('柱状图分析')
-                    elif chart_type == 'pie':
-                        plt.pie(df['value'], labels=df['name'], autopct='%1.1f%%')
-                        plt.title('饼图分析')
-                    elif chart_type == 'line':
-                        plt.plot(df['name'], df['value'], marker='o')
-                        plt.title('折线图分析')
-                    elif chart_type == 'scatter' and len(df) > 1:
-                        # 对于散点图，需要两列数据                        if len(df.columns) >= 2 and all(col in df.columns for col in ['x', 'y']):
-                            plt.scatter(df['x'], df['y'])
-                            plt.title('散点图分析')
-                            plt.xlabel('X轴')
-                            plt.ylabel('Y轴')
-                        else:
-                            result += "警告：散点图需要两列数值数据（x和y），已默认使用柱状图"
-                            plt.bar(df['name'], df['value'])
-                            plt.title('柱状图分析')
-                    
-                    plt.xticks(rotation=45)
-                    plt.tight_layout()
-                    
+                if values is not None:
                     # 保存图表
-                    import time
-                    filename = f"stats_chart_{int(time.time())}.png"
-                    filepath = os.path.join(charts_dir, filename)
-                    plt.savefig(filepath)
-                    plt.close()
+                    filename = f"stats_chart_{time.time_ns()}_{next(_chart_counter)}.png"
+                    filepath = os.path.join(CHARTS_DIR, filename)
+                    
+                    # 在复用的画布上生成图表
+                    with _FIG_LOCK:
+                        ax = _new_chart_axes()
+                        
+                        if chart_type == 'bar':
+                            ax.bar(names, values)
+                            ax.set_title('柱状图分析')
+                        elif chart_type == 'pie':
+                            ax.pie(values, labels=names, autopct='%1.1f%%')
+                            ax.set_title('饼图分析')
+                        elif chart_type == 'line':
+                            ax.plot(names, values, marker='o')
+                            ax.set_title('折线图分析')
+                        elif chart_type == 'scatter' and len(data) > 1:
+                            # 对于散点图，需要两列数据
+                            if df is not None and all(col in df.columns for col in ['x', 'y']):
+                                ax.scatter(df['x'], df['y'])
+                                ax.set_title('散点图分析')
+                                ax.set_xlabel('X轴')
+                                ax.set_ylabel('Y轴')
+                            else:
+                                result += "警告：散点图需要两列数值数据（x和y），已默认使用柱状图"
+                                ax.bar(names, values)
+                                ax.set_title('柱状图分析')
+                        
+                        ax.tick_params(axis='x', labelrotation=45)
+                        _CANVAS.print_png(filepath, pil_kwargs=_PNG_PIL_KWARGS)
                     
                     result += f"图表已生成并保存至：{filepath}\n"
                 else:
@@ -684,15 +1150,15 @@ class MCPFetchTool(BaseTool):
     }]
 
     def call(self, params: str, **kwargs) -> str:
-        import json
-        args = json.loads(params)
+        args = json_loads(params)
         url = args['url']
         max_length = args.get('max_length', 5000)
         raw = args.get('raw', False)
         
         try:
             # 调用MCP fetch服务
-            from laa_assistant import run_mcp  # 临时导入，避免循环依赖            result = run_mcp(
+            from laa_assistant import run_mcp  # 临时导入，避免循环依赖
+            result = run_mcp(
                 server_name='fetch',
                 tool_name='fetch',
                 args={'url': url, 'max_length': max_length, 'raw': raw}
@@ -715,13 +1181,13 @@ class MCPWeatherTool(BaseTool):
     }]
 
     def call(self, params: str, **kwargs) -> str:
-        import json
-        args = json.loads(params)
+        args = json_loads(params)
         city = args['city']
         
         try:
             # 调用MCP天气服务
-            from laa_assistant import run_mcp  # 临时导入，避免循环依赖            result = run_mcp(
+            from laa_assistant import run_mcp  # 临时导入，避免循环依赖
+            result = run_mcp(
                 server_name='juhe-mcp-server',
                 tool_name='get_weather',
                 args={'city': city}
@@ -735,11 +1201,12 @@ class MCPWeatherTool(BaseTool):
         if not result:
             return "未获取到天气信息"
         
-        # 根据实际返回结构格式化输出        if isinstance(result, dict):
+        # 根据实际返回结构格式化输出
+        if isinstance(result, dict):
             if 'weather' in result:
                 return f"天气查询结果：\n城市：{result.get('city', '未知')}\n{result.get('weather', '')}"
             else:
-                return json.dumps(result, ensure_ascii=False, indent=2)
+                return json_dumps_pretty(result)
         return str(result)
 
 @register_tool('mcp_train_ticket')
@@ -771,15 +1238,16 @@ class MCPTrainTicketTool(BaseTool):
     }]
 
     def call(self, params: str, **kwargs) -> str:
-        import json
-        args = json.loads(params)
+        args = json_loads(params)
         departure_station = args['departure_station']
         arrival_station = args['arrival_station']
         date = args['date']
         filter_opt = args.get('filter', '')
         
         try:
-            # 调用MCP火车票查询服务            from laa_assistant import run_mcp  # 临时导入，避免循环依赖            result = run_mcp(
+            # 调用MCP火车票查询服务
+            from laa_assistant import run_mcp  # 临时导入，避免循环依赖
+            result = run_mcp(
                 server_name='juhe-mcp-server',
                 tool_name='query_train_tickets',
                 args={
@@ -796,17 +1264,21 @@ class MCPTrainTicketTool(BaseTool):
     def format_train_result(self, result: dict) -> str:
         """格式化火车票查询结果"""
         if not result:
-            if not result:
             return "未获取到火车票信息"
         
-        # 根据实际返回结构格式化输出        if isinstance(result, dict):
+        # 根据实际返回结构格式化输出
+        if isinstance(result, dict):
             if 'tickets' in result:
                 tickets = result['tickets']
-                result_str = f"火车票查询结果：\n出发站：{result.get('departure_station')}\n到达站：{result.get('arrival_station')}\n日期：{result.get('date')}\n\n车次信息：\n"
-                for ticket in tickets[:5]:  # 最多显示5条记录                    result_str += f"车次：{ticket.get('train_no', 'N/A')} | 出发时间：{ticket.get('departure_time', 'N/A')} | 到达时间：{ticket.get('arrival_time', 'N/A')} | 价格：{ticket.get('price', 'N/A')}\n"
-                return result_str
+                header = f"火车票查询结果：\n出发站：{result.get('departure_station')}\n到达站：{result.get('arrival_station')}\n日期：{result.get('date')}\n\n车次信息：\n"
+                # 最多显示5条记录
+                parts = [
+                    f"车次：{n} | 出发时间：{d} | 到达时间：{a} | 价格：{p}\n"
+                    for n, d, a, p in map(_ticket_fields, tickets[:5])
+                ]
+                return header + "".join(parts)
             else:
-                return json.dumps(result, ensure_ascii=False, indent=2)
+                return json_dumps_pretty(result)
         return str(result)
 
 @register_tool('mcp_maps')
@@ -843,8 +1315,7 @@ class MCPMapsTool(BaseTool):
     }]
 
     def call(self, params: str, **kwargs) -> str:
-        import json
-        args = json.loads(params)
+        args = json_loads(params)
         action = args['action']
         
         try:
@@ -907,9 +1378,21 @@ class MCPMapsTool(BaseTool):
         if not result:
             return f"未获取到{action}信息"
         
-        # 简单格式化输出
+        # 已经是文本的结果直接返回，不经过JSON序列化
+        if isinstance(result, str):
+            return result
+        if isinstance(result, bytes):
+            return result.decode('utf-8', errors='replace')
+        
+        # 调用失败时只返回错误信息
+        if isinstance(result, dict) and result.get('status') == 'error':
+            return f"地图服务调用失败：{result.get('message', '未知错误')}"
+        
+        # 结果会直接交给模型，使用紧凑JSON减少输入token；天气结果保留缩进便于阅读
         if isinstance(result, dict):
-            return json.dumps(result, ensure_ascii=False, indent=2)
+            if action == 'weather':
+                return json_dumps_pretty(result)
+            return json_dumps_compact(result)
         return str(result)
 
 # ====== 图表生成工具实现 ======
@@ -943,107 +1426,101 @@ class ChartTool(BaseTool):
         'type': 'string',
         'description': 'Y轴标签',
         'required': False
+    }, {
+        'name': 'format',
+        'type': 'string',
+        'description': '图片格式 (webp, png)，默认webp',
+        'required': False
     }]
 
     def call(self, params: str, **kwargs) -> str:
-        import json
-        import matplotlib
-        matplotlib.use('Agg')  # 使用非GUI后端
-        import matplotlib.pyplot as plt
-        import numpy as np
-        import pandas as pd
-        import io
-        import base64
-        
-        args = json.loads(params)
+        args = json_loads(params)
         chart_type = args['chart_type']
         data = args['data']
         title = args.get('title', 'Chart')
         x_label = args.get('x_label', '')
         y_label = args.get('y_label', '')
+        image_format = args.get('format', 'webp').lower()
 
-        # 设置中文字体支持
-        plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'DejaVu Sans']
-        plt.rcParams['axes.unicode_minus'] = False
+        if chart_type not in ('bar', 'line', 'pie', 'scatter'):
+            return f"错误：不支持的图表类型'{chart_type}'，支持的类型：bar, line, pie, scatter"
+        if image_format not in CHART_FORMATS:
+            return f"错误：不支持的图片格式'{image_format}'，支持的格式：{', '.join(CHART_FORMATS)}"
 
         # 准备数据
         if not data or not isinstance(data, list) or len(data) == 0:
             return "错误：数据为空或格式不正确"
 
-        # 提取标签和值值        labels = []
-        values = []
-        
-        for item in data:
-            if isinstance(item, dict):
-                if 'name' in item and 'value' in item:
-                    labels.append(str(item['name']))
-                    values.append(float(item['value']))
-                elif 'x' in item and 'y' in item:
-                    labels.append(str(item['x']))
-                    values.append(float(item['y']))
-                else:
-                    # 尝试直接从字典中获取值值                    for key, value in item.items():
-                        labels.append(str(key))
-                        values.append(float(value))
-                        break
-            elif isinstance(item, (list, tuple)) and len(item) >= 2:
-                labels.append(str(item[0]))
-                values.append(float(item[1]))
-            else:
-                return "错误：数据格式不正确，需要包含name和value字段"
-
-        # 创建图表
-        fig, ax = plt.subplots(figsize=(10, 6))
-
-        if chart_type == 'bar':
-            ax.bar(labels, values)
-            ax.set_xlabel(x_label if x_label else '类别')
-            ax.set_ylabel(y_label if y_label else '数值')
-        elif chart_type == 'line':
-            ax.plot(labels, values, marker='o')
-            ax.set_xlabel(x_label if x_label else '类别')
-            ax.set_ylabel(y_label if y_label else '数值')
-            ax.grid(True)
-        elif chart_type == 'pie':
-            ax.pie(values, labels=labels, autopct='%1.1f%%', startangle=90)
-            ax.axis('equal')  # 确保饼图是圆形的
-        elif chart_type == 'scatter':
-            x_vals = list(range(len(values)))
-            ax.scatter(x_vals, values)
-            ax.set_xlabel(x_label if x_label else 'X值')
-            ax.set_ylabel(y_label if y_label else 'Y值')
-            ax.set_xticks(x_vals)
-            ax.set_xticklabels(labels, rotation=45, ha="right")
+        # 根据第一条数据确定格式，整批按同一格式提取标签和值，数值一次性转换为数组
+        first = data[0]
+        if isinstance(first, dict) and 'name' in first and 'value' in first:
+            label_key, value_key = 'name', 'value'
+        elif isinstance(first, dict) and 'x' in first and 'y' in first:
+            label_key, value_key = 'x', 'y'
+        elif isinstance(first, (list, tuple)) and len(first) >= 2:
+            label_key, value_key = 0, 1
         else:
-            plt.close(fig)
-            return f"错误：不支持的图表类型'{chart_type}'，支持的类型：bar, line, pie, scatter"
+            return "错误：数据格式不正确，需要包含name和value字段"
+        
+        try:
+            labels = [str(item[label_key]) for item in data]
+            values = np.asarray([item[value_key] for item in data], dtype=np.float64)
+        except (KeyError, IndexError, TypeError, ValueError):
+            return "错误：数据格式不正确，所有数据项需要使用相同的格式并包含数值"
+
+        if chart_type == 'pie':
+            labels, values = _merge_small_slices(labels, values)
+
+        # 图表文件保存路径
+        filename = f"chart_{time.time_ns()}_{next(_chart_counter)}.{image_format}"
+        filepath = os.path.join(CHARTS_DIR, filename)
+
+        # 在复用的画布上创建图表
+        with _FIG_LOCK:
+            ax = _new_chart_axes()
+
+            if chart_type == 'bar':
+                ax.bar(labels, values)
+                ax.set_xlabel(x_label if x_label else '类别')
+                ax.set_ylabel(y_label if y_label else '数值')
+            elif chart_type == 'line':
+                ax.plot(labels, values, marker='o')
+                ax.set_xlabel(x_label if x_label else '类别')
+                ax.set_ylabel(y_label if y_label else '数值')
+                ax.grid(True)
+            elif chart_type == 'pie':
+                ax.pie(values, labels=labels, autopct='%1.1f%%', startangle=90)
+                ax.axis('equal')  # 确保饼图是圆形的
+            elif chart_type == 'scatter':
+                x_vals = list(range(len(values)))
+                ax.scatter(x_vals, values)
+                ax.set_xlabel(x_label if x_label else 'X值')
+                ax.set_ylabel(y_label if y_label else 'Y值')
+                ax.set_xticks(x_vals)
+                ax.set_xticklabels(labels, rotation=45, ha="right")
+
+            ax.set_title(title)
+
+            # 直接写入图表文件，布局由constrained布局在绘制时完成
+            _FIG.savefig(filepath, format=image_format, dpi=150, pil_kwargs=CHART_FORMATS[image_format])
 
-        ax.set_title(title)
+        return f"图表生成成功！图表已保存到{filepath}。图表类型 {chart_type}, 数据点数 {len(data)}"
 
-        # 调整布局，防止标签被截断
-        plt.tight_layout()
 
-        # 将图表保存到内存中的字节流        img_buffer = io.BytesIO()
-        plt.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight')
-        img_buffer.seek(0)
+# 助理的模型配置和系统提示词，导入时创建一次
+_LAA_CONFIG = {
+    'model': 'qwen-turbo',
+    'timeout': 30,
+    'retry_count': 3,
+}
 
-        # 将图片转换为base64编码
-        img_base64 = base64.b64encode(img_buffer.getvalue()).decode()
-        plt.close(fig)  # 关闭图形以释放内存
-        # 创建一个临时文件保存图表（如果需要）
-        import tempfile
-        import os
-        temp_dir = os.path.join(os.path.dirname(__file__), 'resource', 'charts')
-        os.makedirs(temp_dir, exist_ok=True)
-        
-        import time
-        filename = f"chart_{int(time.time())}.png"
-        filepath = os.path.join(temp_dir, filename)
-        
-        with open(filepath, 'wb') as f:
-            f.write(img_buffer.getvalue())
+_LAA_SYSTEM_PROMPT = """我是您的个人AI助理（LAA），零号，我可以帮助您管理任务、记录笔记、查询天气、搜索网络信息、生成图表，以及搜索景点信息和进行数据统计。        
+以下是可用的功能：1. 任务管理：创建、查看、更新、删除个人任务 2. 笔记记录：记录和检索个人笔记 3. 天气查询：查询指定城市的天气信息
+4. 网络搜索：获取网络信息 5. 图表生成：根据数据生成柱状图、折线图、饼图、散点图等 6. 景点搜索：搜索指定地点的景点信息，并提供景点图片链接
+7. 数据统计：对数据进行统计分析并生成可视化图表
+8. MCP服务集成：提供URL内容获取、天气查询、火车票查询、地图服务等功能
 
-        return f"图表生成成功！图表已保存到{filepath}。图表类型 {chart_type}, 数据点数 {len(data)}"
+我会根据您的需求智能使用这些功能。"""
 
 
 class LAAAssistant:
@@ -1051,57 +1528,36 @@ class LAAAssistant:
     轻量级个人AI助理主类
     """
     def __init__(self):
-        self.db_path = os.path.join(ROOT_RESOURCE, 'laa_data.db')
+        self.db_path = _DB_PATH
         self._init_database()
         self.bot = None
     
     def _init_database(self):
         """
-        初始化本地SQLite数据库        """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # 创建任务表表        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS tasks (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                description TEXT,
-                status TEXT DEFAULT 'pending',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                completed_at TIMESTAMP NULL
-            )
-        ''')
-        
-        # 创建笔记表表        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS notes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                content TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        初始化本地SQLite数据库
+        """
+        # 创建任务表、笔记表及索引，一次执行完成
+        # 使用当前线程的连接（已启用WAL模式和性能参数），不在实例上长期持有
+        _get_conn().executescript(SQL_SCHEMA)
     
     def get_assistant_config(self):
         """
         获取助理配置
         """
-        system_prompt = """我是您的个人AI助理（LAA），零号，我可以帮助您管理任务、记录笔记、查询天气、搜索网络信息、生成图表，以及搜索景点信息和进行数据统计。        
-以下是可用的功能：1. 任务管理：创建、查看、更新、删除个人任务 2. 笔记记录：记录和检索个人笔记 3. 天气查询：查询指定城市的天气信息
-4. 网络搜索：获取网络信息 5. 图表生成：根据数据生成柱状图、折线图、饼图、散点图等 6. 景点搜索：搜索指定地点的景点信息，并提供景点图片链接
-7. 数据统计：对数据进行统计分析并生成可视化图表
-8. MCP服务集成：提供URL内容获取、天气查询、火车票查询、地图服务等功能
+        # 返回配置的副本，调用方修改时不影响模块级常量
+        return dict(_LAA_CONFIG), _LAA_SYSTEM_PROMPT
 
-我会根据您的需求智能使用这些功能。"""
-        
-        return {
-            'model': 'qwen-turbo',
-            'timeout': 30,
-            'retry_count': 3,
-        }, system_prompt
+
+# 可用的MCP服务器及其工具（根据MCP服务配置.md），导入时构建一次
+_AVAILABLE_SERVERS = {
+    "amap-maps": frozenset({"maps_geo", "maps_regeocode", "maps_weather", "maps_direction_driving", "maps_distance", "maps_text_search", "maps_search_detail"}),
+    "fetch": frozenset({"fetch"}),
+    "bing-cn-mcp-server": frozenset({"bing_search", "fetch_webpage"}),
+    "juhe-mcp-server": frozenset({"get_weather", "query_train_tickets", "book_train_ticket", "pay_train_ticket"}),
+}
+
+# 高德地图API key在导入时读取一次
+_AMAP_API_KEY = os.environ.get("AMAP_API_KEY", "")
 
 
 # 初始化助理服务
@@ -1117,40 +1573,30 @@ def run_mcp(server_name: str, tool_name: str, args: dict):
     Returns:
         服务调用结果
     """
-    import os
-    import json
-
     try:
         # 打印调用信息
         print(f"调用MCP服务: {server_name}.{tool_name}")
         print(f"参数: {args}")
         
-        # 检查MCP服务器是否可用- 根据MCP服务配置.md优化配置
-        available_servers = {
-            "amap-maps": ["maps_geo", "maps_regeocode", "maps_weather", "maps_direction_driving", "maps_distance", "maps_text_search", "maps_search_detail"],
-            "fetch": ["fetch"],
-            "bing-cn-mcp-server": ["bing_search", "fetch_webpage"],
-            "juhe-mcp-server": ["get_weather", "query_train_tickets", "book_train_ticket", "pay_train_ticket"]
-        }
-        
-        if server_name not in available_servers:
+        # 检查MCP服务器是否可用
+        available_tools = _AVAILABLE_SERVERS.get(server_name)
+        if available_tools is None:
             return {
                 'status': 'error',
                 'message': f'未知的MCP服务器: {server_name}',
-                'available_servers': list(available_servers.keys())
+                'available_servers': list(_AVAILABLE_SERVERS)
             }
             
-        if tool_name not in available_servers[server_name]:
+        if tool_name not in available_tools:
             return {
                 'status': 'error',
                 'message': f'未知的工具名称 {tool_name}',
-                'available_tools': available_servers[server_name]
+                'available_tools': sorted(available_tools)
             }
         
-        # 对于高德地图服务，尝试从环境变量获取API key
+        # 对于高德地图服务，检查是否设置了API key
         if server_name == "amap-maps":
-            amap_api_key = os.environ.get("AMAP_API_KEY", "")
-            if amap_api_key:
+            if _AMAP_API_KEY:
                 print("高德地图API key已设置，将使用真实服务")
             else:
                 print("警告: 未设置环境变量AMAP_API_KEY，将使用配置的默认值")
@@ -1187,8 +1633,6 @@ def init_agent_service():
     Returns:
         配置好的Assistant实例
     """
-    from qwen_agent.agents import Assistant
-    
     # 获取助理配置
     laa = LAAAssistant()
     config, system_prompt = laa.get_assistant_config()
@@ -1220,9 +1664,26 @@ def app_tui():
                 messages.append({'role': 'user', 'content': query})
                 
                 print("正在处理您的请求...")
+                sys.stdout.write('LAA回复: ')
+                # 流式输出：每次只打印最后一条消息新增的内容，而不是重复打印整个消息列表
                 response = []
+                printed_index = 0
+                printed_len = 0
                 for response in bot.run(messages):
-                    print(f'LAA回复: {response}')
+                    if not response:
+                        continue
+                    content = response[-1].get('content') or ''
+                    if not isinstance(content, str):
+                        continue
+                    if len(response) - 1 != printed_index:
+                        # 开始了新的一条消息（如工具调用结果），换行后从头打印
+                        sys.stdout.write('\n')
+                        printed_index = len(response) - 1
+                        printed_len = 0
+                    sys.stdout.write(content[printed_len:])
+                    sys.stdout.flush()
+                    printed_len = len(content)
+                sys.stdout.write('\n')
                 messages.extend(response)
                 
             except KeyboardInterrupt: